@@ -1,197 +1,292 @@
+from concurrent.futures import ProcessPoolExecutor
+from enum import IntEnum
+from functools import lru_cache
 from itertools import product
 from dataclasses import dataclass
-from typing import List, Tuple, Dict, Any
+from types import MappingProxyType
+from typing import List, Tuple, Dict, Any, Iterator, Mapping
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba only accelerates, it is not required
+    njit = None
 
 
 # =========================================================
 # Data structure
 # =========================================================
 
-@dataclass
+class ElementKind(IntEnum):
+    # Int-valued so sorting/grouping compares machine ints, not strings
+    HWP = 0
+    QWP = 1
+    BS = 2
+    PBS = 3
+    PhasePlate = 4
+    PathSwap = 5
+
+
+# Display names indexed by ElementKind value
+_NAMES = tuple(kind.name for kind in ElementKind)
+
+
+@dataclass(frozen=True, slots=True)
 class OpticalElement:
-    element: str
-    params: Dict[str, Any]
+    element: ElementKind
+    params: Mapping[str, Any]
     location: Any
     stage: int = 0
 
 
+# Shared read-only params mappings, so the O(2^N) element loops below don't
+# allocate a fresh dict per element. The proxies are genuinely immutable,
+# which keeps the lru_cache'd gate templates safe to hand out.
+_EMPTY = MappingProxyType({})
+_QWP_0 = MappingProxyType({"angle": "0"})
+_QWP_PI4 = MappingProxyType({"angle": "pi/4"})
+_HWP_PI8 = MappingProxyType({"angle": "pi/8"})
+_HWP_3PI8 = MappingProxyType({"angle": "3pi/8"})
+_HWP_PI2 = MappingProxyType({"angle": "pi/2"})
+_BS_PHI_PI2 = MappingProxyType({"phi": "pi/2"})
+_PP_NEG_PI2 = MappingProxyType({"phi": "-pi/2"})
+_PP_POS_PI2 = MappingProxyType({"phi": "pi/2"})
+
+
 # =========================================================
 # Helpers
 # =========================================================
 
 def all_bitstrings(n):
-    return list(product([0, 1], repeat=n))
+    # Lazy: yields 2^n tuples without materializing them all at once
+    return product((0, 1), repeat=n)
+
+
+def _bits_to_tuple(x: int, n: int):
+    # Unpack an n-bit path index into the (MSB-first) tuple convention
+    return tuple((x >> (n - 1 - i)) & 1 for i in range(n))
+
+
+def location_bits(location, n_path: int):
+    # Locations are stored as packed path-index ints (or pairs of them);
+    # unpack back into bit tuples for display/inspection
+    if isinstance(location, int):
+        return _bits_to_tuple(location, n_path)
+    if isinstance(location, tuple):
+        return tuple(_bits_to_tuple(p, n_path) for p in location)
+    return location
 
 
 def paired_paths_for_qubit(N: int, k: int):
     n_path = N - 1
     k_idx = k - 2
 
-    pairs = []
-    for bits in all_bitstrings(n_path):
-        if bits[k_idx] == 0:
-            other = list(bits)
-            other[k_idx] = 1
-            pairs.append((bits, tuple(other)))
-    return pairs
+    # Enumerate path indices as plain ints and pair each index that has
+    # the k-th bit clear with the one where it is set. Splitting the index
+    # into bits above/below position b emits exactly the zero-bit set in
+    # ascending order, with no filtering pass over the rejected half.
+    b = n_path - 1 - k_idx
+    mask = 1 << b
+    return [((hi << (b + 1)) | lo, (hi << (b + 1)) | lo | mask)
+            for hi in range(1 << (n_path - b - 1))
+            for lo in range(1 << b)]
+
+
+def _cnot_pairs_numpy(n_path: int, c_shift: int, t_shift: int):
+    x = np.arange(1 << n_path, dtype=np.uint64)
+    sel = (((x >> c_shift) & 1) == 1) & (((x >> t_shift) & 1) == 0)
+    hits = x[sel]
+    return hits, hits | np.uint64(1 << t_shift)
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _cnot_pairs_jit(n_path, c_shift, t_shift):
+        # At most 2^(n_path-2) paths have the control bit set and the
+        # target bit clear (exactly that many when the shifts differ),
+        # which bounds the allocation; the slice keeps degenerate
+        # inputs from exposing uninitialized slots.
+        src = np.empty(1 << (n_path - 2), np.uint64)
+        dst = np.empty_like(src)
+        k = 0
+        for x in range(1 << n_path):
+            if ((x >> c_shift) & 1) and not ((x >> t_shift) & 1):
+                src[k] = x
+                dst[k] = x | (1 << t_shift)
+                k += 1
+        return src[:k], dst[:k]
+else:
+    _cnot_pairs_jit = None
+
+
+def _cnot_path_pairs(n_path: int, c_idx: int, t_idx: int):
+    # Scan for paths with control bit set and target bit clear; pairs
+    # each hit with the target-bit-flipped path. Jitted when numba is
+    # available, NumPy-vectorized otherwise.
+    c_shift = n_path - 1 - c_idx
+    t_shift = n_path - 1 - t_idx
+    if _cnot_pairs_jit is not None and n_path >= 2:
+        hits, swapped = _cnot_pairs_jit(n_path, c_shift, t_shift)
+    else:
+        hits, swapped = _cnot_pairs_numpy(n_path, c_shift, t_shift)
+    return zip(hits.tolist(), swapped.tolist())
 
 
 def paths_with_bit(N: int, k: int, value: int):
     n_path = N - 1
     k_idx = k - 2
-    return [bits for bits in all_bitstrings(n_path) if bits[k_idx] == value]
+    mask = 1 << (n_path - 1 - k_idx)
+    if value:
+        return [x for x in range(1 << n_path) if x & mask]
+    return [x for x in range(1 << n_path) if not (x & mask)]
 
 
 # =========================================================
 # Single-gate compiler (your logic preserved)
 # =========================================================
 
+def _rx_pol_root(N, i, j):
+    # R^1_x = QWP(0) - HWP(pi/8) - QWP(0)
+    for p in range(2 ** (N - 1)):
+        yield OpticalElement(ElementKind.QWP, _QWP_0, p)
+        yield OpticalElement(ElementKind.HWP, _HWP_PI8, p)
+        yield OpticalElement(ElementKind.QWP, _QWP_0, p)
+
+
+def _ry_pol_root(N, i, j):
+    # R^1_y = QWP(pi/4) - HWP(3pi/8) - QWP(pi/4)
+    for p in range(2 ** (N - 1)):
+        yield OpticalElement(ElementKind.QWP, _QWP_PI4, p)
+        yield OpticalElement(ElementKind.HWP, _HWP_3PI8, p)
+        yield OpticalElement(ElementKind.QWP, _QWP_PI4, p)
+
+
+def _rx_path(N, i, j):
+    for p0, p1 in paired_paths_for_qubit(N, i):
+        yield OpticalElement(ElementKind.BS, _EMPTY, (p0, p1))
+
+
+def _ry_path(N, i, j):
+    # R_y on path qubit:
+    # PhasePlate(-pi/2) on first path
+    # BS with phi = pi/2
+    # PhasePlate(+pi/2) on first path
+    for p0, p1 in paired_paths_for_qubit(N, i):
+        yield OpticalElement(ElementKind.PhasePlate, _PP_NEG_PI2, p0)
+        yield OpticalElement(ElementKind.BS, _BS_PHI_PI2, (p0, p1))
+        yield OpticalElement(ElementKind.PhasePlate, _PP_POS_PI2, p0)
+
+
+def _rx_path_only(N, i, j):
+    # All qubits are path-encoded
+    return _rx_path(N + 1, i + 1, j)
+
+
+def _ry_path_only(N, i, j):
+    # All qubits are path-encoded
+    return _ry_path(N + 1, i + 1, j)
+
+
+def _cnot_pol_to_path(N, i, j):
+    for p0, p1 in paired_paths_for_qubit(N, j):
+        yield OpticalElement(ElementKind.PBS, _EMPTY, (p0, p1))
+
+
+def _cnot_path_to_path(N, i, j):
+    for p0, p1 in _cnot_path_pairs(N - 1, i - 2, j - 2):
+        yield OpticalElement(ElementKind.PathSwap, _EMPTY, (p0, p1))
+
+
+def _cnot_path_to_pol(N, i, j):
+    for p in paths_with_bit(N, i, 1):
+        yield OpticalElement(ElementKind.HWP, _HWP_PI2, p)
+
+
+def _cnot_path_only(N, i, j):
+    # All qubits are path encoded
+    for p0, p1 in _cnot_path_pairs(N, i - 1, j - 1):
+        yield OpticalElement(ElementKind.PathSwap, _EMPTY, (p0, p1))
+
+
+# One dict lookup on (gate, encoding, i==1, j==1) replaces the branch
+# cascade that was re-evaluated on every compile call.
+_GATE_DISPATCH = {
+    ("Rx", "pol_path", True, None): _rx_pol_root,
+    ("Rx", "pol_path", False, None): _rx_path,
+    ("Ry", "pol_path", True, None): _ry_pol_root,
+    ("Ry", "pol_path", False, None): _ry_path,
+    ("Rx", "path_only", True, None): _rx_path_only,
+    ("Rx", "path_only", False, None): _rx_path_only,
+    ("Ry", "path_only", True, None): _ry_path_only,
+    ("Ry", "path_only", False, None): _ry_path_only,
+    ("CNOT", "pol_path", True, False): _cnot_pol_to_path,
+    ("CNOT", "pol_path", False, False): _cnot_path_to_path,
+    ("CNOT", "pol_path", False, True): _cnot_path_to_pol,
+    ("CNOT", "path_only", True, False): _cnot_path_only,
+    ("CNOT", "path_only", True, True): _cnot_path_only,
+    ("CNOT", "path_only", False, False): _cnot_path_only,
+    ("CNOT", "path_only", False, True): _cnot_path_only,
+}
+
+
+# Output length of each kernel, so templates can be built into a
+# preallocated buffer instead of a growing list. These are upper bounds:
+# exact for every well-formed gate, while degenerate inputs (e.g. a CNOT
+# with i == j, which compiles to nothing) fill fewer slots.
+_KERNEL_SIZE = {
+    _rx_pol_root: lambda N: 3 * 2 ** (N - 1),
+    _ry_pol_root: lambda N: 3 * 2 ** (N - 1),
+    _rx_path: lambda N: 2 ** (N - 2),
+    _ry_path: lambda N: 3 * 2 ** (N - 2),
+    _rx_path_only: lambda N: 2 ** (N - 1),
+    _ry_path_only: lambda N: 3 * 2 ** (N - 1),
+    _cnot_pol_to_path: lambda N: 2 ** (N - 2),
+    _cnot_path_to_path: lambda N: 1 << max(N - 3, 0),
+    _cnot_path_to_pol: lambda N: 2 ** (N - 2),
+    _cnot_path_only: lambda N: 2 ** (N - 2),
+}
+
+
 def optical_implementation(gate: str,
                            N: int,
                            i: int = None,
                            j: int = None,
-                           encoding: str = "pol_path") -> List[OpticalElement]:
+                           encoding: str = "pol_path") -> Iterator[OpticalElement]:
 
-    elements = []
     if encoding not in ("pol_path", "path_only"):
         raise ValueError("encoding must be 'pol_path' or 'path_only'")
 
-    # ---- Single-qubit rotations ----
-    if gate in ("Rx", "Ry"):
-        k = i
-
-        if encoding == "pol_path" and k == 1:
-            n_paths = 2 ** (N - 1)
-
-            if gate == "Rx":
-                # R^1_x = QWP(0) - HWP(pi/8) - QWP(0)
-                for p in range(n_paths):
-                    elements.extend([
-                        OpticalElement("QWP", {"angle": "0"}, f"path_{p}"),
-                        OpticalElement("HWP", {"angle": "pi/8"}, f"path_{p}"),
-                        OpticalElement("QWP", {"angle": "0"}, f"path_{p}")
-                    ])
-
-            elif gate == "Ry":
-                # R^1_y = QWP(pi/4) - HWP(3pi/8) - QWP(pi/4)
-                for p in range(n_paths):
-                    elements.extend([
-                        OpticalElement("QWP", {"angle": "pi/4"}, f"path_{p}"),
-                        OpticalElement("HWP", {"angle": "3pi/8"}, f"path_{p}"),
-                        OpticalElement("QWP", {"angle": "pi/4"}, f"path_{p}")
-                    ])
-
-        elif encoding == "path_only":
-            # All qubits are path-encoded
-            pairs = paired_paths_for_qubit(N + 1, k + 1)
-
-            if gate == "Rx":
-                for p0, p1 in pairs:
-                    elements.append(
-                        OpticalElement("BS", {}, (p0, p1))
-                    )
-
-            elif gate == "Ry":
-                # R_y on path qubit:
-                # PhasePlate(-pi/2) on first path
-                # BS with phi = pi/2
-                # PhasePlate(+pi/2) on first path
-                for p0, p1 in pairs:
-                    elements.append(
-                        OpticalElement("PhasePlate", {"phi": "-pi/2"}, p0)
-                    )
-                    elements.append(
-                        OpticalElement("BS", {"phi": "pi/2"}, (p0, p1))
-                    )
-                    elements.append(
-                        OpticalElement("PhasePlate", {"phi": "pi/2"}, p0)
-                    )
-
-        else:
-            pairs = paired_paths_for_qubit(N, k)
-
-            if gate == "Rx":
-                for p0, p1 in pairs:
-                    elements.append(
-                        OpticalElement("BS", {}, (p0, p1))
-                    )
-
-            elif gate == "Ry":
-                # R_y on path qubit:
-                # PhasePlate(-pi/2) on first path
-                # BS with phi = pi/2
-                # PhasePlate(+pi/2) on first path
-                for p0, p1 in pairs:
-                    elements.append(
-                        OpticalElement("PhasePlate", {"phi": "-pi/2"}, p0)
-                    )
-                    elements.append(
-                        OpticalElement("BS", {"phi": "pi/2"}, (p0, p1))
-                    )
-                    elements.append(
-                        OpticalElement("PhasePlate", {"phi": "pi/2"}, p0)
-                    )
-
-    # ---- CNOT gates ----
-    elif gate == "CNOT":
-
-        control = i
-        target = j
-
-        if encoding == "pol_path":
-
-            # Polarization -> Path
-            if control == 1 and target != 1:
-                pairs = paired_paths_for_qubit(N, target)
-                for p0, p1 in pairs:
-                    elements.append(
-                        OpticalElement("PBS", {}, (p0, p1))
-                    )
-
-            # Path -> Path
-            elif control != 1 and target != 1:
-                n_path = N - 1
-                c_idx = control - 2
-                t_idx = target - 2
-
-                for bits in all_bitstrings(n_path):
-                    if bits[c_idx] == 1 and bits[t_idx] == 0:
-                        swapped = list(bits)
-                        swapped[t_idx] = 1
-                        elements.append(
-                            OpticalElement("PathSwap", {}, (bits, tuple(swapped)))
-                        )
-
-            # Path -> Polarization
-            elif control != 1 and target == 1:
-                one_paths = paths_with_bit(N, control, 1)
-                for p in one_paths:
-                    elements.append(
-                        OpticalElement("HWP", {"angle": "pi/2"}, p)
-                    )
-
-            else:
-                raise ValueError("Unsupported CNOT configuration")
+    kernel = _GATE_DISPATCH.get((gate, encoding, i == 1, None if j is None else j == 1))
+    if kernel is None:
+        if gate == "CNOT":
+            raise ValueError("Unsupported CNOT configuration")
+        raise ValueError("Unknown gate")
 
-        elif encoding == "path_only":
+    return kernel(N, i, j)
 
-            # All qubits are path encoded
-            n_path = N
-            c_idx = control - 1
-            t_idx = target - 1
 
-            for bits in all_bitstrings(n_path):
-                if bits[c_idx] == 1 and bits[t_idx] == 0:
-                    swapped = list(bits)
-                    swapped[t_idx] = 1
-                    elements.append(
-                        OpticalElement("PathSwap", {}, (bits, tuple(swapped)))
-                    )
+# optical_implementation is pure in (gate, N, i, j, encoding), so reused
+# gates are compiled once and served as immutable stage-0 templates.
+@lru_cache(maxsize=None)
+def _gate_template(gate: str, N: int, i, j, encoding: str) -> Tuple[OpticalElement, ...]:
+    stream = optical_implementation(gate, N, i=i, j=j, encoding=encoding)
+    kernel = _GATE_DISPATCH[(gate, encoding, i == 1, None if j is None else j == 1)]
+    out = [None] * _KERNEL_SIZE[kernel](N)
+    count = 0
+    for e in stream:
+        out[count] = e
+        count += 1
+    del out[count:]
+    return tuple(out)
 
-    else:
-        raise ValueError("Unknown gate")
 
-    return elements
+# Module-level so ProcessPoolExecutor can pickle it; each worker keeps its
+# own _gate_template cache. Params cross the process boundary as plain
+# dict copies (mappingproxy objects do not pickle) and the parent re-wraps
+# them read-only.
+def _compile_gate(spec):
+    return [(e.element, dict(e.params), e.location) for e in _gate_template(*spec)]
 
 
 # =========================================================
@@ -203,24 +298,59 @@ class OpticalCircuit:
     def __init__(self, N, encoding: str = "pol_path"):
         self.N = N
         self.encoding = encoding
-        self.elements: List[OpticalElement] = []
+        # Compact (element, params, location, stage) tuples; OpticalElement
+        # views are only materialized on demand via the elements property
+        self._records: List[Tuple[ElementKind, Mapping[str, Any], Any, int]] = []
         self.stage = 0
+        # add_gate/__mul__ append in nondecreasing stage order, so summary
+        # can skip sorting unless the element list was edited by hand
+        self._sorted = True
+
+    @property
+    def elements(self) -> List[OpticalElement]:
+        return [OpticalElement(*r) for r in self._records]
 
     # Add gate sequentially
     def add_gate(self, gate: str, i=None, j=None):
-        elems = optical_implementation(
-            gate,
-            self.N,
-            i=i,
-            j=j,
-            encoding=self.encoding
+        template = _gate_template(gate, self.N, i, j, self.encoding)
+
+        self._records.extend(
+            (e.element, e.params, e.location, self.stage) for e in template
         )
+        self.stage += 1
 
-        for e in elems:
-            e.stage = self.stage
+    # Add several gates at once; independent compilations are dispatched
+    # to worker processes when the batch is large enough to pay for the pool
+    def add_gates(self, gates, parallel_threshold: int = 8):
+        specs = []
+        for spec in gates:
+            gate, i, j = (tuple(spec) + (None, None))[:3]
+            specs.append((gate, self.N, i, j, self.encoding))
 
-        self.elements.extend(elems)
-        self.stage += 1
+        if len(specs) < parallel_threshold:
+            templates = [_gate_template(*spec) for spec in specs]
+        else:
+            with ProcessPoolExecutor() as pool:
+                compiled = list(pool.map(_compile_gate, specs))
+            # Re-wrap the transported params read-only, deduplicated by
+            # content so equal settings share one proxy
+            proxies = {}
+            templates = []
+            for recs in compiled:
+                template = []
+                for el, pa, lo in recs:
+                    key = tuple(sorted(pa.items()))
+                    proxy = proxies.get(key)
+                    if proxy is None:
+                        proxy = proxies[key] = MappingProxyType(pa)
+                    template.append(OpticalElement(el, proxy, lo))
+                templates.append(template)
+
+        for template in templates:
+            self._records.extend(
+                (e.element, e.params, e.location, self.stage) for e in template
+            )
+            self.stage += 1
 
     # Algebraic composition
     def __mul__(self, other):
@@ -229,20 +359,64 @@ class OpticalCircuit:
 
         new = OpticalCircuit(self.N, encoding=self.encoding)
 
-        new.elements = (
-            self.elements +
-            [OpticalElement(e.element, e.params, e.location, e.stage + self.stage)
-             for e in other.elements]
+        new._records = (
+            self._records +
+            [(el, pa, lo, st + self.stage) for el, pa, lo, st in other._records]
         )
 
         new.stage = self.stage + other.stage
+        # other's stages are offset past self's, so concatenation keeps order
+        new._sorted = self._sorted and other._sorted
         return new
 
+    # Structure-of-arrays export: one NumPy array per field, so downstream
+    # consumers (simulators, plotters) can transform circuits vectorized
+    # instead of iterating Python objects. Single-path locations are
+    # duplicated into loc0/loc1; params dicts are deduplicated into a
+    # table addressed by the returned param_key array.
+    def to_arrays(self):
+        n = len(self._records)
+        kind = np.empty(n, np.uint8)
+        stage = np.empty(n, np.uint32)
+        loc0 = np.empty(n, np.uint64)
+        loc1 = np.empty(n, np.uint64)
+        param_key = np.empty(n, np.uint16)
+
+        params_table = []
+        param_ids = {}
+        for idx, (element, params, location, st) in enumerate(self._records):
+            kind[idx] = element
+            stage[idx] = st
+            if isinstance(location, tuple):
+                loc0[idx], loc1[idx] = location
+            else:
+                loc0[idx] = loc1[idx] = location
+            key = tuple(sorted(params.items()))
+            pk = param_ids.get(key)
+            if pk is None:
+                pk = param_ids[key] = len(params_table)
+                params_table.append(params)
+            param_key[idx] = pk
+
+        arrays = {
+            "kind": kind,
+            "stage": stage,
+            "loc0": loc0,
+            "loc1": loc1,
+            "param_key": param_key,
+        }
+        return arrays, params_table
+
     # Pretty print
     def summary(self):
+        n_path = self.N if self.encoding == "path_only" else self.N - 1
         print("\n===== Optical Circuit =====")
-        for e in sorted(self.elements, key=lambda x: x.stage):
-            print(f"Stage {e.stage}: {e.element:10} | loc={e.location} | {e.params}")
+        ordered = self._records if self._sorted else sorted(self._records, key=lambda r: r[3])
+        for element, params, location, stage in ordered:
+            # Single ints are path indices; pairs are unpacked to bit tuples
+            loc = f"path_{location}" if isinstance(location, int) \
+                else location_bits(location, n_path)
+            print(f"Stage {stage}: {_NAMES[element]:10} | loc={loc} | {dict(params)}")
         print("===========================\n")
 
 